@@ -1,41 +1,161 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import pandas as pd
 
-# Data
-markets = ['4090', 'A100', 'H100', '3090', 'A6000', '4080', '3080', '4070', 'A5000', '3070', '3060', 'A40', 'Laptop', 'A4000', '4060']
-max_performance = [127.19, 113.98, 113.92, 110.96, 104.64, 101.02, 97.39, 97.09, 92.28, 84.90, 81.64, 79.73, 66.49, 64.22, 50.47]
-average_performance = [94.17, 73.10, 96.43, 78.90, 82.50, 72.72, 63.15, 63.94, 87.26, 51.15, 45.68, 69.53, 26.71, 52.86, 42.98]
-
-# Create DataFrame
-df = pd.DataFrame({
-    'Market': markets,
-    'Max': max_performance,
-    'Average': average_performance
-})
-
-# Sort DataFrame by Max performance
-df = df.sort_values('Max', ascending=False)
-
-# Create the plot
-plt.figure(figsize=(12, 8))
-bar_width = 0.35
-index = range(len(df['Market']))
-
-plt.bar(index, df['Max'], bar_width, label='Max', color='#1f77b4', alpha=0.8)
-plt.bar([i + bar_width for i in index], df['Average'], bar_width, label='Average', color='#ff7f0e', alpha=0.8)
-
-# Customize the plot
-plt.xlabel('Market', fontsize=12)
-plt.ylabel('Tokens per Second', fontsize=12)
-plt.title('Llama3-8B Inference Speed per Market: Max vs Average', fontsize=14)
-plt.xticks([i + bar_width/2 for i in index], df['Market'], rotation=45, ha='right')
-plt.legend()
-
-# Add value labels on top of each bar
-for i, v in enumerate(df['Max']):
-    plt.text(i, v, f'{v:.1f}', ha='center', va='bottom', fontsize=8)
-for i, v in enumerate(df['Average']):
-    plt.text(i + bar_width, v, f'{v:.1f}', ha='center', va='bottom', fontsize=8)
-
-plt.tight_layout()
-plt.show()
\ No newline at end of file
+from results_store import load_results
+
+RESULTS_DIR = '../results'
+CHARTS_DIR = '../results/charts'
+MANIFEST_FILE = 'manifest.json'
+
+# Bump when the chart layout changes so every chart gets re-rendered
+CHART_VERSION = 1
+
+# CU metrics to chart and their axis labels
+CU_METRICS = {
+    'MeanTokensPerSecond': 'Output Speed (Output Tokens/s)',
+    'EndUserSpeed': 'End User Speed (Output Tokens/s)',
+    'NettoTokensPerSecond': 'Total Speed (Output+Input Tokens/s)',
+    'AverageLatency': 'Latency (s)',
+    'PricePerMillionTokens': 'Price ($ per 1M Tokens)',
+}
+
+# Build the per-model market charts from the performance_per_market table of statistics.py
+def market_charts(per_market):
+    charts = []
+    for model, model_df in per_market.groupby('Model', sort=True):
+        data = model_df[['Market', 'MaxTokensPerSecond', 'AvgTokensPerSecond']].rename(
+            columns={'MaxTokensPerSecond': 'Max', 'AvgTokensPerSecond': 'Average'})
+        charts.append({
+            'file': f'{model}_tokens_per_second.png',
+            'title': f'{model} Inference Speed per Market: Max vs Average',
+            'ylabel': 'Tokens per Second',
+            'data': data,
+        })
+    return charts
+
+# Build one chart per model, CU level and metric from the CU benchmark table of statistics_CU.py
+def cu_charts(cu_df):
+    metric_columns = [col for col in cu_df.columns
+                      if col.startswith('CU') and col.split('_', 1)[1] in CU_METRICS]
+    # Aggregate all metrics in one pass, then slice per chart
+    per_market = cu_df.groupby(['ModelName', 'Market'])[metric_columns].agg(['max', 'mean'])
+
+    charts = []
+    for col in sorted(metric_columns):
+        cu_prefix, metric = col.split('_', 1)
+        for model in sorted(per_market.index.get_level_values('ModelName').unique()):
+            data = per_market.loc[model, col].dropna().reset_index()
+            if data.empty:
+                continue
+            data.columns = ['Market', 'Max', 'Average']
+            charts.append({
+                'file': os.path.join('CU', f'{model}_{cu_prefix}_{metric}.png'),
+                'title': f'{model} {CU_METRICS[metric]} per Market at {cu_prefix[2:]} Concurrent Users: Max vs Average',
+                'ylabel': CU_METRICS[metric],
+                'data': data.round(2),
+            })
+    return charts
+
+# Hash everything that ends up in a chart, so unchanged charts can be skipped
+def chart_hash(chart):
+    digest = hashlib.sha256(f"{CHART_VERSION}|{chart['title']}|{chart['ylabel']}".encode())
+    digest.update('|'.join(chart['data'].columns).encode())
+    digest.update(pd.util.hash_pandas_object(chart['data'], index=False).values.tobytes())
+    return digest.hexdigest()
+
+def render_chart(chart, output_dir):
+    df = chart['data'].sort_values('Max', ascending=False)
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    bar_width = 0.35
+    index = range(len(df['Market']))
+
+    ax.bar(index, df['Max'], bar_width, label='Max', color='#1f77b4', alpha=0.8)
+    ax.bar([i + bar_width for i in index], df['Average'], bar_width, label='Average', color='#ff7f0e', alpha=0.8)
+
+    ax.set_xlabel('Market', fontsize=12)
+    ax.set_ylabel(chart['ylabel'], fontsize=12)
+    ax.set_title(chart['title'], fontsize=14)
+    ax.set_xticks([i + bar_width/2 for i in index])
+    ax.set_xticklabels(df['Market'], rotation=45, ha='right')
+    ax.legend()
+
+    # Add value labels on top of each bar
+    for i, v in enumerate(df['Max']):
+        ax.text(i, v, f'{v:.1f}', ha='center', va='bottom', fontsize=8)
+    for i, v in enumerate(df['Average']):
+        ax.text(i + bar_width, v, f'{v:.1f}', ha='center', va='bottom', fontsize=8)
+
+    fig.tight_layout()
+
+    path = os.path.join(output_dir, chart['file'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp.png'
+    fig.savefig(tmp_path)
+    plt.close(fig)
+    os.replace(tmp_path, path)
+    return chart['file']
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILE), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Render benchmark charts from the published results.')
+    parser.add_argument('--results_dir', default=RESULTS_DIR, help='Directory holding the published results')
+    parser.add_argument('--output_dir', default=CHARTS_DIR, help='Directory to write the charts to')
+    parser.add_argument('--workers', type=int, default=None, help='Number of render processes (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Re-render every chart, even if its input is unchanged')
+    args = parser.parse_args()
+
+    charts = []
+    try:
+        charts += market_charts(load_results(args.results_dir, 'node_performance')['performance_per_market'])
+    except FileNotFoundError:
+        print("No published results from statistics.py found, skipping market charts")
+    try:
+        charts += cu_charts(load_results(args.results_dir, 'cu_benchmark')['CU_benchmark_results_Nosana'])
+    except FileNotFoundError:
+        print("No published results from statistics_CU.py found, skipping CU charts")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    manifest = load_manifest(args.output_dir)
+    hashes = {chart['file']: chart_hash(chart) for chart in charts}
+
+    stale = [
+        chart for chart in charts
+        if args.force
+        or manifest.get(chart['file']) != hashes[chart['file']]
+        or not os.path.exists(os.path.join(args.output_dir, chart['file']))
+    ]
+
+    if stale:
+        try:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                for file in executor.map(render_chart, stale, [args.output_dir] * len(stale)):
+                    manifest[file] = hashes[file]
+        finally:
+            # Record what did render, so a failed run doesn't redo finished charts
+            save_manifest(args.output_dir, manifest)
+
+    print(f"Rendered {len(stale)} charts, skipped {len(charts) - len(stale)} unchanged charts")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from typing import Dict, List, Optional, Union
+
+import msgspec
+
+# Typed schemas of the job records written by collection/src/extraction/extraction.js.
+# Only the fields used by the analysis are declared, everything else the
+# collector stores is skipped by the decoder without building Python objects.
+
+class GpuInfo(msgspec.Struct, gc=False):
+    name: Optional[str] = None
+
+# gpu_info maps GPU indices ("1", "2", ...) to GPU details, next to a few plain values
+GpuInfoValue = Union[GpuInfo, str, int, float, bool, List[object], None]
+
+class Specs(msgspec.Struct, gc=False):
+    cpu: Optional[str] = None
+    gpu_info: Dict[str, GpuInfoValue] = {}
+
+# Benchmark results as produced by extractBenchmarkResults.js, one struct for both result kinds
+class Metrics(msgspec.Struct, gc=False):
+    # Single request model benchmarks (gemma, llama3, ...)
+    tokensPerSecond: Optional[float] = None
+    producedTokens: Optional[int] = None
+    # Concurrent user benchmarks (results_CU_*), fields required by statistics_CU.py default to None
+    totalDuration: Optional[float] = None
+    totalTokensProduced: Optional[int] = None
+    totalInputTokens: Optional[int] = None
+    averageTokensPerSecond: Optional[float] = None
+    NosanaPrice: Optional[float] = None
+    averageLatency: Optional[float] = 0
+    concurrentUsers: Optional[int] = 0
+    modelName: Optional[str] = "Unknown Model"
+    AvgClockSpeed: Optional[float] = 0
+    AvgPowerUsage: Optional[float] = 0
+    AvgUtilization: Optional[float] = 0
+
+class JobData(msgspec.Struct, gc=False):
+    specs: Specs = msgspec.field(default_factory=Specs)
+    performance: Dict[str, Metrics] = {}
+
+class Job(msgspec.Struct, gc=False):
+    node: Optional[str] = None
+    market: Optional[str] = None
+    # Stored as strings by the collector
+    price: Optional[str] = None
+    duration: Optional[str] = None
+    # Unix timestamps in seconds, missing in records collected before they were stored
+    time_start: Optional[float] = None
+    time_end: Optional[float] = None
+    data: JobData = msgspec.field(default_factory=JobData)
+
+class RecordDecodeError(ValueError):
+    def __init__(self, job_id, message):
+        super().__init__(f"job {job_id}: {message}")
+        self.job_id = job_id
+        self.message = message
+
+_jobs_decoder = msgspec.json.Decoder(Dict[str, Job])
+_raw_jobs_decoder = msgspec.json.Decoder(Dict[str, msgspec.Raw])
+_job_decoder = msgspec.json.Decoder(Job)
+
+# Decode the records one by one, so a malformed record is reported without losing the others
+def decode_jobs(raw_jobs, errors):
+    for job_id, raw_job in raw_jobs.items():
+        try:
+            yield job_id, _job_decoder.decode(raw_job)
+        except (msgspec.ValidationError, msgspec.DecodeError) as error:
+            errors.append(RecordDecodeError(job_id, str(error)))
+
+# Load the benchmark data file as {job id: Job}, plus the records that failed to decode.
+# The whole file is decoded in one pass. Only if that fails, the records are decoded
+# one by one from raw slices of the file, to find and skip the malformed ones.
+def load_jobs(file_path):
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    try:
+        return _jobs_decoder.decode(content), []
+    except msgspec.ValidationError:
+        pass
+    errors = []
+    return dict(decode_jobs(_raw_jobs_decoder.decode(content), errors)), errors
+
+def report_decode_errors(errors, limit=10):
+    if not errors:
+        return
+    print(f"\nSkipped {len(errors)} malformed job records:")
+    for error in errors[:limit]:
+        print(f"  {error}")
+    if len(errors) > limit:
+        print(f"  ... and {len(errors) - limit} more")
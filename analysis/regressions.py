@@ -0,0 +1,374 @@
+import argparse
+import math
+
+import numpy as np
+import pandas as pd
+
+from records import load_jobs, report_decode_errors
+from results_store import load_results, publish_results
+
+RESULTS_DIR = '../results'
+RESULTS_DATASET = 'regressions'
+
+# Page's CUSUM parameters, in units of the baseline standard deviation
+DRIFT_ALLOWANCE = 0.5
+
+# Mean number of in-control samples between two false alarms of one side of a
+# detector. With thousands of detectors, a few hundred samples each, false
+# alarms have to be rarer than once in a million samples.
+TARGET_FALSE_ALARM_RUN = 1_000_000
+
+# Solve Siegmund's approximation of the in-control average run length,
+# ARL = (exp(2kb) - 2kb - 1) / 2k^2 with b = h + 1.166, for the threshold h
+def alarm_threshold(target_run, drift=DRIFT_ALLOWANCE):
+    def average_run_length(threshold):
+        b = 2 * drift * (threshold + 1.166)
+        return (math.exp(b) - b - 1) / (2 * drift ** 2)
+    low, high = 0.0, 100.0
+    for _ in range(100):
+        middle = (low + high) / 2
+        if average_run_length(middle) < target_run:
+            low = middle
+        else:
+            high = middle
+    return high
+
+ALARM_THRESHOLD = alarm_threshold(TARGET_FALSE_ALARM_RUN)
+
+# The baseline starts as the median of the first WARMUP_SAMPLES samples, with a
+# standard deviation estimated from their median absolute deviation, so a few
+# outlier jobs don't skew it. After that every sample refines the baseline until
+# the next change point. Samples are clipped to CLIP_STD standard deviations.
+WARMUP_SAMPLES = 30
+MAD_TO_STD = 1.4826
+CLIP_STD = 3.0
+
+# Floor for the baseline standard deviation relative to the baseline, so
+# nodes with very stable results don't raise alarms on noise
+MIN_RELATIVE_STD = 0.02
+
+# Smallest shift relative to the baseline that is reported as a change point
+MIN_RELATIVE_CHANGE = 0.10
+
+# CU level used for the single request model benchmarks (llama3, gemma, ...)
+SINGLE_REQUEST_CU = 0
+
+STATE_COLUMNS = [
+    'Node', 'Model', 'CU', 'Warmup', 'Samples', 'Baseline', 'BaselineM2',
+    'LowerCusum', 'LowerOnsetJob', 'LowerSum', 'LowerCount',
+    'UpperCusum', 'UpperOnsetJob', 'UpperSum', 'UpperCount',
+    'Regressed', 'RegressionBaseline', 'LastJob'
+]
+EVENT_COLUMNS = [
+    'Node', 'Model', 'CU', 'Direction', 'OnsetJob', 'DetectedJob',
+    'BaselineTokensPerSecond', 'ShiftedTokensPerSecond', 'ChangePercent'
+]
+
+def load_data(file_path):
+    data, errors = load_jobs(file_path)
+    report_decode_errors(errors)
+    return data
+
+# Two sided CUSUM over the tokens per second of one node, model and CU level.
+# The lower side detects regressions, the upper side detects recoveries. The
+# state is constant size, so the detectors can be kept for every node at once.
+class ChangePointDetector:
+    __slots__ = (
+        'warmup', 'samples', 'baseline', 'baseline_m2',
+        'lower_cusum', 'lower_onset_job', 'lower_sum', 'lower_count',
+        'upper_cusum', 'upper_onset_job', 'upper_sum', 'upper_count',
+        'regressed', 'regression_baseline', 'last_job'
+    )
+
+    def __init__(self):
+        self.regressed = False
+        # Baseline before the first unrecovered regression, a recovery has to get back near it
+        self.regression_baseline = None
+        self.last_job = None
+        self._reset()
+
+    # Start a new baseline after a change point
+    def _reset(self):
+        self.warmup = []
+        self.samples = 0
+        self.baseline = None
+        self.baseline_m2 = 0.0
+        self._reset_lower()
+        self._reset_upper()
+
+    def _reset_lower(self):
+        self.lower_cusum = 0.0
+        self.lower_onset_job = None
+        self.lower_sum = 0.0
+        self.lower_count = 0
+
+    def _reset_upper(self):
+        self.upper_cusum = 0.0
+        self.upper_onset_job = None
+        self.upper_sum = 0.0
+        self.upper_count = 0
+
+    def _learn_baseline(self):
+        samples = np.array(self.warmup)
+        median = float(np.median(samples))
+        std = MAD_TO_STD * float(np.median(np.abs(samples - median)))
+        self.samples = len(samples)
+        self.baseline = median
+        self.baseline_m2 = std ** 2 * (self.samples - 1)
+        self.warmup = []
+
+    def _baseline_std(self):
+        std = math.sqrt(self.baseline_m2 / (self.samples - 1))
+        return max(std, MIN_RELATIVE_STD * abs(self.baseline), 1e-9)
+
+    # Welford's update of the baseline with a clipped sample
+    def _refine_baseline(self, value, std):
+        value = min(max(value, self.baseline - CLIP_STD * std), self.baseline + CLIP_STD * std)
+        self.samples += 1
+        delta = value - self.baseline
+        self.baseline += delta / self.samples
+        self.baseline_m2 += delta * (value - self.baseline)
+
+    # Feed one sample, returns (direction, onset job, baseline, shifted level) on a change point
+    def update(self, value, job_id):
+        self.last_job = job_id
+
+        if self.baseline is None:
+            self.warmup.append(value)
+            if len(self.warmup) == WARMUP_SAMPLES:
+                self._learn_baseline()
+            return None
+
+        std = self._baseline_std()
+        # Clipped, so single outlier jobs can't raise an alarm on their own
+        z = min(max((value - self.baseline) / std, -CLIP_STD), CLIP_STD)
+
+        lower_cusum = max(0.0, self.lower_cusum - z - DRIFT_ALLOWANCE)
+        if lower_cusum > 0:
+            if self.lower_count == 0:
+                self.lower_onset_job = job_id
+            self.lower_cusum = lower_cusum
+            self.lower_sum += value
+            self.lower_count += 1
+        else:
+            self._reset_lower()
+
+        upper_cusum = max(0.0, self.upper_cusum + z - DRIFT_ALLOWANCE)
+        if upper_cusum > 0:
+            if self.upper_count == 0:
+                self.upper_onset_job = job_id
+            self.upper_cusum = upper_cusum
+            self.upper_sum += value
+            self.upper_count += 1
+        else:
+            self._reset_upper()
+
+        change = None
+        if self.lower_cusum > ALARM_THRESHOLD:
+            shifted = self.lower_sum / self.lower_count
+            if shifted > self.baseline * (1 - MIN_RELATIVE_CHANGE):
+                # Statistically significant but too small to matter, keep the baseline
+                self._reset_lower()
+                return None
+            change = ('Regression', self.lower_onset_job, self.baseline, shifted)
+            if not self.regressed:
+                self.regressed = True
+                self.regression_baseline = self.baseline
+        elif self.upper_cusum > ALARM_THRESHOLD:
+            shifted = self.upper_sum / self.upper_count
+            if shifted < self.baseline * (1 + MIN_RELATIVE_CHANGE):
+                self._reset_upper()
+                return None
+            # Only a rise back near the level before the regression is reported as a
+            # recovery, other improvements just move the baseline
+            if self.regressed and shifted >= self.regression_baseline * (1 - MIN_RELATIVE_CHANGE):
+                change = ('Recovery', self.upper_onset_job, self.baseline, shifted)
+                self.regressed = False
+                self.regression_baseline = None
+        else:
+            self._refine_baseline(value, std)
+            return None
+
+        self._reset()
+        return change
+
+    def to_row(self):
+        return [
+            list(self.warmup), self.samples, self.baseline, self.baseline_m2,
+            self.lower_cusum, self.lower_onset_job, self.lower_sum, self.lower_count,
+            self.upper_cusum, self.upper_onset_job, self.upper_sum, self.upper_count,
+            self.regressed, self.regression_baseline, self.last_job
+        ]
+
+    @classmethod
+    def from_row(cls, row):
+        detector = cls()
+        (detector.warmup, detector.samples, detector.baseline, detector.baseline_m2,
+         detector.lower_cusum, detector.lower_onset_job, detector.lower_sum, detector.lower_count,
+         detector.upper_cusum, detector.upper_onset_job, detector.upper_sum, detector.upper_count,
+         detector.regressed, detector.regression_baseline, detector.last_job) = row
+        # Arrow hands lists back as arrays and missing floats as NaN
+        detector.warmup = [float(value) for value in detector.warmup]
+        if pd.isna(detector.baseline):
+            detector.baseline = None
+        if pd.isna(detector.regression_baseline):
+            detector.regression_baseline = None
+        return detector
+
+# Yield (model, CU level, tokens per second) for every benchmark result of a job
+def extract_samples(job):
+    for key, metrics in job.data.performance.items():
+        if metrics.averageTokensPerSecond is not None:
+            # Same imbalance filter as statistics_CU.py
+            if (metrics.totalInputTokens or 0) > (metrics.totalTokensProduced or 0)*2:
+                continue
+            yield metrics.modelName, metrics.concurrentUsers, metrics.averageTokensPerSecond
+        elif metrics.tokensPerSecond is not None:
+            yield key, SINGLE_REQUEST_CU, metrics.tokensPerSecond
+
+# The jobs in the order their samples are fed to the detectors. The collector
+# stores jobs newest first and merges the results of its workers in any order,
+# so jobs are sorted by time_end. Records collected before time_end was stored
+# come first, in data order, which is only roughly chronological.
+def order_jobs(data):
+    untimed = [(job_id, job) for job_id, job in data.items() if job.time_end is None]
+    timed = sorted(
+        ((job_id, job) for job_id, job in data.items() if job.time_end is not None),
+        key=lambda item: (item[1].time_end, item[0])
+    )
+    return untimed, timed
+
+# The jobs still to be processed after a previous run, the progress after them
+# and the number of jobs skipped because they ended before the last processed
+# job, or None if the data doesn't continue the data of the previous run.
+# Progress is (untimed jobs processed, last untimed job, timed jobs processed,
+# last processed time_end). Skipped jobs are only processed by a --full run.
+def pending_jobs(data, progress=None):
+    untimed, timed = order_jobs(data)
+    untimed_processed, last_untimed_job, timed_processed, last_time_end = progress or (0, None, 0, None)
+    if untimed_processed > len(untimed) or (untimed_processed and untimed[untimed_processed - 1][0] != last_untimed_job):
+        return None
+    start = 0
+    if last_time_end is not None:
+        start = next((i for i, (_, job) in enumerate(timed) if job.time_end > last_time_end), len(timed))
+    jobs = untimed[untimed_processed:] + timed[start:]
+    progress = (
+        len(untimed),
+        untimed[-1][0] if untimed else None,
+        timed_processed + len(timed) - start,
+        timed[-1][1].time_end if timed else last_time_end
+    )
+    return jobs, progress, start - timed_processed
+
+# Run the detectors over (job id, job) pairs in order
+def detect_regressions(jobs, detectors):
+    events = []
+    for job_id, job in jobs:
+        node_id = job.node
+        for model, cu, tokens_per_second in extract_samples(job):
+            key = (node_id, model, cu)
+            detector = detectors.get(key)
+            if detector is None:
+                detector = detectors[key] = ChangePointDetector()
+            change = detector.update(float(tokens_per_second), job_id)
+            if change:
+                direction, onset_job, baseline, shifted = change
+                events.append([
+                    node_id, model, cu, direction, onset_job, job_id,
+                    round(baseline, 2), round(shifted, 2),
+                    round((shifted - baseline) / baseline * 100, 2) if baseline else None
+                ])
+    return pd.DataFrame(events, columns=EVENT_COLUMNS)
+
+def state_to_df(detectors):
+    return pd.DataFrame(
+        [[*key, *detector.to_row()] for key, detector in detectors.items()],
+        columns=STATE_COLUMNS
+    )
+
+def state_from_df(state_df):
+    return {
+        (row[0], row[1], row[2]): ChangePointDetector.from_row(row[3:])
+        for row in state_df[STATE_COLUMNS].itertuples(index=False, name=None)
+    }
+
+# The regressions a node has not recovered from yet, one row per node, model and CU level
+def active_regressions(events_df, detectors):
+    regressed = {key for key, detector in detectors.items() if detector.regressed}
+    regressions = events_df[events_df['Direction'] == 'Regression']
+    latest = regressions.drop_duplicates(subset=['Node', 'Model', 'CU'], keep='last')
+    is_active = pd.Series(
+        [key in regressed for key in latest[['Node', 'Model', 'CU']].itertuples(index=False, name=None)],
+        index=latest.index, dtype=bool
+    )
+    return latest[is_active].drop(columns=['Direction']).reset_index(drop=True)
+
+PROGRESS_COLUMNS = ['UntimedJobs', 'LastUntimedJobID', 'TimedJobs', 'LastTimeEnd']
+
+def progress_to_df(progress):
+    return pd.DataFrame([progress], columns=PROGRESS_COLUMNS)
+
+def progress_from_df(progress_df):
+    untimed_processed, last_untimed_job, timed_processed, last_time_end = progress_df[PROGRESS_COLUMNS].iloc[0]
+    return (
+        int(untimed_processed),
+        None if pd.isna(last_untimed_job) else last_untimed_job,
+        int(timed_processed),
+        None if pd.isna(last_time_end) else float(last_time_end)
+    )
+
+# Load the results of the previous run, or None if it can't be continued
+def load_previous_run(results_dir):
+    try:
+        previous = load_results(results_dir, RESULTS_DATASET)
+    except FileNotFoundError:
+        return None
+    # State written by an older version of this script can't be continued
+    if not set(STATE_COLUMNS) <= set(previous['detector_state'].columns):
+        return None
+    if not set(PROGRESS_COLUMNS) <= set(previous['progress'].columns):
+        return None
+    return previous
+
+def main():
+    parser = argparse.ArgumentParser(description='Detect per node performance regressions in the benchmark data.')
+    parser.add_argument('--full', action='store_true', help='Ignore the previous run and process all jobs again')
+    parser.add_argument('--results_dir', default=RESULTS_DIR, help='Directory holding the published results')
+    parser.add_argument('file_path', nargs='?', default='../data/benchmark_data.json', type=str, help='Path to the benchmark data JSON file')
+    args = parser.parse_args()
+
+    data = load_data(args.file_path)
+
+    previous = None if args.full else load_previous_run(args.results_dir)
+    pending = pending_jobs(data, progress_from_df(previous['progress'])) if previous else None
+    if pending:
+        detectors = state_from_df(previous['detector_state'])
+        previous_events = previous['node_regressions']
+    else:
+        pending = pending_jobs(data)
+        detectors, previous_events = {}, pd.DataFrame(columns=EVENT_COLUMNS)
+    jobs, progress, skipped = pending
+
+    new_events = detect_regressions(jobs, detectors)
+    frames = [df for df in (previous_events, new_events) if len(df)]
+    events_df = pd.concat(frames, ignore_index=True) if frames else new_events
+
+    print(f"\nProcessed {len(jobs)} new jobs ({len(data) - len(jobs) - skipped} already processed)")
+    if skipped:
+        print(f"Skipped {skipped} jobs that ended before the last processed job, run with --full to include them")
+    print(f"Detected {len(new_events)} new change points")
+
+    active_df = active_regressions(events_df, detectors)
+    print(f"\nActive regressions: {len(active_df)}")
+    if len(active_df):
+        print(active_df.to_string(index=False))
+
+    publish_results(args.results_dir, RESULTS_DATASET, {
+        'node_regressions': events_df,
+        'active_regressions': active_df,
+        'detector_state': state_to_df(detectors),
+        'progress': progress_to_df(progress),
+    })
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import itertools
+import os
+import shutil
+import time
+
+import pyarrow as pa
+
+# Results are published as immutable generations:
+#
+#   results/<dataset>/generations/<generation>/<table>.arrow
+#   results/<dataset>/CURRENT  (name of the live generation)
+#
+# A generation is fully written and renamed into place before CURRENT is
+# swapped with os.replace, so readers only ever see complete generations.
+GENERATIONS_DIR = 'generations'
+POINTER_FILE = 'CURRENT'
+TABLE_SUFFIX = '.arrow'
+
+# Number of old generations kept around for readers that still have them mapped
+KEEP_GENERATIONS = 3
+
+# Staging directories untouched for this long belong to killed runs, no
+# publish takes anywhere near this long
+STALE_STAGING_SECONDS = 24 * 60 * 60
+
+_generation_counter = itertools.count()
+
+
+# Directories can't be opened for fsync on Windows, there the file fsyncs and
+# os.replace already make a publish atomic
+def _fsync_dir(path):
+    if os.name == 'nt':
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+# Generation names start with a fixed width UTC timestamp in nanoseconds, so
+# they sort chronologically. The pid and a per process counter keep names
+# unique between runs and between publishes of one run.
+def _new_generation_name():
+    seconds, nanoseconds = divmod(time.time_ns(), 10**9)
+    timestamp = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(seconds))}.{nanoseconds:09d}"
+    return f"{timestamp}-{os.getpid()}-{next(_generation_counter)}"
+
+
+def _generation_timestamp(name):
+    return name.split('-')[0]
+
+
+# Write a DataFrame as an uncompressed Arrow IPC file so readers can memory map it
+def _write_table(df, path):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+# Swap the CURRENT pointer of a dataset to the given generation
+def _swap_pointer(dataset_dir, generation):
+    tmp_pointer = os.path.join(dataset_dir, f'{POINTER_FILE}.{os.getpid()}.tmp')
+    with open(tmp_pointer, 'w') as f:
+        f.write(generation)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, os.path.join(dataset_dir, POINTER_FILE))
+    _fsync_dir(dataset_dir)
+
+
+# Load every table of the live generation of a dataset, memory mapped read-only
+def load_results(results_dir, dataset):
+    with open(os.path.join(results_dir, dataset, POINTER_FILE), 'r') as f:
+        generation_dir = os.path.join(results_dir, dataset, GENERATIONS_DIR, f.read().strip())
+    tables = {}
+    for name in sorted(os.listdir(generation_dir)):
+        if name.endswith(TABLE_SUFFIX):
+            source = pa.memory_map(os.path.join(generation_dir, name), 'r')
+            tables[name[:-len(TABLE_SUFFIX)]] = pa.ipc.open_file(source).read_all().to_pandas()
+    return tables
+
+
+# Remove old generations, never touching the live one. Staging directories
+# are only removed once they haven't been written to for STALE_STAGING_SECONDS,
+# a run that is still writing its generation keeps its staging directory.
+def _prune_generations(dataset_dir, live, keep=KEEP_GENERATIONS):
+    generations_dir = os.path.join(dataset_dir, GENERATIONS_DIR)
+    names = os.listdir(generations_dir)
+    stale_before = time.time() - STALE_STAGING_SECONDS
+    for name in names:
+        path = os.path.join(generations_dir, name)
+        if name.endswith('.tmp'):
+            try:
+                stale = os.path.getmtime(path) < stale_before
+            except FileNotFoundError:
+                continue
+            if stale:
+                shutil.rmtree(path, ignore_errors=True)
+    generations = sorted(
+        (name for name in names if not name.endswith('.tmp') and name != live),
+        key=_generation_timestamp
+    )
+    for name in generations[:max(len(generations) - (keep - 1), 0)]:
+        shutil.rmtree(os.path.join(generations_dir, name), ignore_errors=True)
+
+
+# Publish a dict of {table name: DataFrame} as a new generation of a dataset
+def publish_results(results_dir, dataset, tables, keep=KEEP_GENERATIONS):
+    dataset_dir = os.path.join(results_dir, dataset)
+    generations_dir = os.path.join(dataset_dir, GENERATIONS_DIR)
+    os.makedirs(generations_dir, exist_ok=True)
+
+    generation = _new_generation_name()
+    staging_dir = os.path.join(generations_dir, f'{generation}.tmp')
+    os.makedirs(staging_dir)
+    try:
+        for name, df in tables.items():
+            _write_table(df, os.path.join(staging_dir, f'{name}{TABLE_SUFFIX}'))
+        _fsync_dir(staging_dir)
+        os.rename(staging_dir, os.path.join(generations_dir, generation))
+        _fsync_dir(generations_dir)
+    except BaseException:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    _swap_pointer(dataset_dir, generation)
+    _prune_generations(dataset_dir, generation, keep)
+    return os.path.join(generations_dir, generation)
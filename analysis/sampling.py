@@ -0,0 +1,69 @@
+import argparse
+import hashlib
+import heapq
+import math
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SEED = 42
+
+# Two sided 95% quantile of the standard normal distribution
+Z_95 = 1.959964
+
+# Argparse type for --sample
+def sample_fraction(value):
+    fraction = float(value)
+    if not 0 < fraction <= 1:
+        raise argparse.ArgumentTypeError(f"sample fraction must be in (0, 1], got {value}")
+    return fraction
+
+# Argparse type for --sample-jobs
+def sample_size(value):
+    size = int(value)
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"sample size must be a positive number of jobs, got {value}")
+    return size
+
+def add_sample_arguments(parser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--sample', type=sample_fraction, metavar='FRACTION', help='Preview on a sample of this fraction of the jobs of every node, with 95%% confidence intervals of the means')
+    group.add_argument('--sample-jobs', type=sample_size, metavar='N', help='Preview on a sample of about N jobs, spread over the nodes like --sample (every node keeps at least one job)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed of the preview sample')
+
+# Fraction of the jobs to keep for the sample arguments, or None for a full run
+def resolve_sample_fraction(args, total_jobs):
+    if args.sample is not None:
+        return args.sample
+    if args.sample_jobs is not None:
+        return min(1.0, args.sample_jobs / total_jobs) if total_jobs else 1.0
+    return None
+
+def _job_hash(seed, job_id):
+    return int.from_bytes(hashlib.blake2b(f'{seed}:{job_id}'.encode(), digest_size=8).digest(), 'big')
+
+# Stratified sample of every node's jobs: keep the ceil(fraction * n) jobs of
+# a node with n jobs that have the smallest seeded hash of their id. The same
+# seed picks the same jobs on every run, and every node keeps at least one job.
+# Jobs are yielded in their original order.
+def sample_jobs(jobs, fraction, seed=DEFAULT_SEED):
+    jobs = list(jobs)
+    node_hashes = defaultdict(list)
+    for index, (job_id, job) in enumerate(jobs):
+        node_hashes[job.node].append((_job_hash(seed, job_id), index))
+    selected = set()
+    for hashes in node_hashes.values():
+        selected.update(index for _, index in heapq.nsmallest(math.ceil(fraction * len(hashes)), hashes))
+    for index in sorted(selected):
+        yield jobs[index]
+
+# Mean of a column per group, with a normal approximation 95% confidence interval
+def mean_confidence_interval(df, by, column):
+    summary = df.groupby(by)[column].agg(['mean', 'std', 'count'])
+    margin = Z_95 * summary['std'] / np.sqrt(summary['count'])
+    return pd.DataFrame({
+        'CI95Low': (summary['mean'] - margin).round(2),
+        'CI95High': (summary['mean'] + margin).round(2),
+        'Samples': summary['count'],
+    }).reset_index()
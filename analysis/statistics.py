@@ -1,8 +1,13 @@
-import json
 import pandas as pd
 from collections import defaultdict
 import argparse
-import os
+
+from records import GpuInfo, load_jobs, report_decode_errors
+from results_store import publish_results
+from sampling import add_sample_arguments, mean_confidence_interval, resolve_sample_fraction, sample_jobs
+
+RESULTS_DIR = '../results'
+RESULTS_DATASET = 'node_performance'
 
 # Define the mapping from market IDs to market names
 MARKET_MAP = {
@@ -25,8 +30,9 @@ MARKET_MAP = {
 }
 
 def load_data(file_path):
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    data, errors = load_jobs(file_path)
+    report_decode_errors(errors)
+    return data
 
 def extract_info(data):
     cpu_counts = defaultdict(int)
@@ -38,22 +44,21 @@ def extract_info(data):
 
     for job_id, job in data.items():
         total_jobs += 1
-        node_id = job.get("node")
+        node_id = job.node
         node_job_counts[node_id] += 1
 
         if node_id in seen_nodes:
             continue
         seen_nodes.add(node_id)
 
-        specs = job.get("data", {}).get("specs", {})
-        cpu = specs.get("cpu")
+        specs = job.data.specs
+        cpu = specs.cpu
         if cpu:
             cpu_counts[cpu] += 1
 
-        gpu_info = specs.get("gpu_info", {})
-        for key, value in gpu_info.items():
-            if isinstance(value, dict):
-                gpu_name = value.get("name")
+        for key, value in specs.gpu_info.items():
+            if isinstance(value, GpuInfo):
+                gpu_name = value.name
                 if gpu_name:
                     gpu_counts[gpu_name] += 1
                     if cpu:
@@ -65,22 +70,21 @@ def extract_performance_data(data):
     performance_data = []
 
     for job_id, job in data.items():
-        node_id = job.get("node")
-        market_id = job.get("market")  # Get the market ID
+        node_id = job.node
+        market_id = job.market  # Get the market ID
         market_name = MARKET_MAP.get(market_id, "Unknown")  # Map to market name
-        specs = job.get("data", {}).get("specs", {})
-        performance = job.get("data", {}).get("performance", {})
+        specs = job.data.specs
+        performance = job.data.performance
 
-        cpu = specs.get("cpu")
-        gpu_info = specs.get("gpu_info", {})
+        cpu = specs.cpu
         
-        for gpu_key, gpu_value in gpu_info.items():
-            if isinstance(gpu_value, dict):
-                gpu_name = gpu_value.get("name")
+        for gpu_key, gpu_value in specs.gpu_info.items():
+            if isinstance(gpu_value, GpuInfo):
+                gpu_name = gpu_value.name
                 
                 for model, metrics in performance.items():
-                    tokens_per_second = metrics.get("tokensPerSecond")
-                    produced_tokens = metrics.get("producedTokens")
+                    tokens_per_second = metrics.tokensPerSecond
+                    produced_tokens = metrics.producedTokens
                     
                     if tokens_per_second is not None and produced_tokens is not None:
                         performance_data.append({
@@ -113,10 +117,6 @@ def analyze_small_model_node_performance(performance_df):
 
 def analyze_model_performance(performance_df, model):
     model_df = performance_df[performance_df['Model'] == model]
-    
-    results_dir = '../results'
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
 
     model_performance_summary = model_df.groupby(['Node', 'Market', 'GPU', 'CPU']).agg(
         MeanTokensPerSecond=('TokensPerSecond', 'mean'),
@@ -137,8 +137,8 @@ def analyze_node_complications(data, node_job_counts):
     total_complications = 0
 
     for job_id, job in data.items():
-        node_id = job.get("node")
-        performance = job.get("data", {}).get("performance", {})
+        node_id = job.node
+        performance = job.data.performance
 
         if not performance:
             node_complications[node_id]["no_performance_data"] += 1
@@ -172,13 +172,31 @@ def calculate_max_performance_per_market(performance_df, model='llama3'):
     max_performance['TokensPerSecond'] = max_performance['TokensPerSecond'].round(2)
     return max_performance
 
-def calculate_avg_performance_per_market(performance_df, model='llama3'):
+def calculate_avg_performance_per_market(performance_df, model='llama3', confidence_interval=False):
     model_df = performance_df[performance_df['Model'] == model]
     avg_performance = model_df.groupby('Market')['TokensPerSecond'].mean().reset_index()
     avg_performance = avg_performance.sort_values('TokensPerSecond', ascending=False)
     avg_performance['TokensPerSecond'] = avg_performance['TokensPerSecond'].round(2)
+    if confidence_interval:
+        avg_performance = pd.merge(avg_performance, mean_confidence_interval(model_df, 'Market', 'TokensPerSecond'), on='Market')
     return avg_performance
 
+def calculate_performance_per_market(performance_df):
+    per_market = []
+    for model in performance_df['Model'].unique():
+        max_performance = calculate_max_performance_per_market(performance_df, model)
+        avg_performance = calculate_avg_performance_per_market(performance_df, model)
+        model_performance = pd.merge(
+            max_performance.rename(columns={'TokensPerSecond': 'MaxTokensPerSecond'}),
+            avg_performance.rename(columns={'TokensPerSecond': 'AvgTokensPerSecond'}),
+            on='Market'
+        )
+        model_performance.insert(0, 'Model', model)
+        per_market.append(model_performance)
+    if not per_market:
+        return pd.DataFrame(columns=['Model', 'Market', 'MaxTokensPerSecond', 'AvgTokensPerSecond'])
+    return pd.concat(per_market, ignore_index=True)
+
 def main():
     parser = argparse.ArgumentParser(description='Analyze benchmark data.')
     parser.add_argument('--hardware', action='store_true', help='Print unique GPU and CPU counts')
@@ -187,10 +205,19 @@ def main():
     parser.add_argument('--max', action='store_true', help='Print maximum observed tokens per second for each GPU and model')
     parser.add_argument('--complications', action='store_true', help='Print node complications')
     parser.add_argument('file_path', nargs='?', default='../data/benchmark_data.json', type=str, help='Path to the benchmark data JSON file')
+    add_sample_arguments(parser)
     args = parser.parse_args()
 
     data = load_data(args.file_path)
 
+    # Preview runs work on a sample, attach confidence intervals and don't publish results
+    sample_fraction = resolve_sample_fraction(args, len(data))
+    preview = sample_fraction is not None
+    if preview:
+        total_jobs_available = len(data)
+        data = dict(sample_jobs(data.items(), sample_fraction, args.seed))
+        print(f"\nPreview on a sample of {len(data)} of {total_jobs_available} jobs (seed {args.seed})")
+
     cpu_counts, gpu_counts, unique_nodes_count, total_jobs, node_job_counts, gpu_cpu_combinations = extract_info(data)
 
 
@@ -219,15 +246,25 @@ def main():
         print("\nTop 10 Most Frequent GPU-CPU Combinations:")
         print(combinations_df.to_string(index=False))
 
+    if performance_df.empty:
+        if preview:
+            print("\nNo jobs with performance data in the sample, try a larger --sample or --sample-jobs")
+        else:
+            print("\nNo jobs with performance data, nothing to analyze")
+        return
+
+    # Tables published together as one results generation
+    results = {}
+
     models = performance_df['Model'].unique()
     for model in models:
         model_performance_summary = analyze_model_performance(performance_df, model)
-        # If model name is llama3_70b, save the file as llama3-70b_performance_summary.csv
+        # If model name is llama3_70b, save the table as model_llama3-70b_performance_summary
         if model == 'llama3_70b':
-            csv_filename = f'../results/model_llama3-70b_performance_summary.csv'
+            table_name = 'model_llama3-70b_performance_summary'
         else:
-            csv_filename = f'../results/model_{model}_performance_summary.csv'
-        model_performance_summary.to_csv(csv_filename, index=False)
+            table_name = f'model_{model}_performance_summary'
+        results[table_name] = model_performance_summary
 
     small_model_gpu_performance = performance_df[performance_df['Model'] != 'llama3_70b'].groupby('GPU').agg(
         MeanTokensPerSecond=('TokensPerSecond', 'mean'),
@@ -242,12 +279,16 @@ def main():
 
     small_model_gpu_performance = small_model_gpu_performance.sort_values(by='MeanTokensPerSecond', ascending=False)
 
-    if args.gpu:
+    if preview:
+        gpu_confidence_intervals = mean_confidence_interval(performance_df[performance_df['Model'] != 'llama3_70b'], 'GPU', 'TokensPerSecond')
+        small_model_gpu_performance = pd.merge(small_model_gpu_performance, gpu_confidence_intervals, on='GPU')
+
+    if args.gpu or preview:
         print("\nSmall Model GPU Performance:")
         print(small_model_gpu_performance.to_string(index=False))
         print(f"\nTotal number of unique jobs with GPU data: {gpu_job_counts['Jobs'].sum()}")
 
-    small_model_gpu_performance.to_csv('../results/small_model_gpu_performance.csv', index=False)
+    results['small_model_gpu_performance'] = small_model_gpu_performance
 
     small_model_node_performance = analyze_small_model_node_performance(performance_df)
 
@@ -258,7 +299,19 @@ def main():
         print(small_model_node_performance.to_string(index=False))
         print(f"\nTotal number of jobs with performance data: {small_model_node_performance['Jobs'].sum()}")
 
-    small_model_node_performance.to_csv('../results/small_model_node_performance_summary.csv', index=False)
+    results['small_model_node_performance_summary'] = small_model_node_performance
+
+    # Max and average tokens per second per market for every model, used by plot.py
+    results['performance_per_market'] = calculate_performance_per_market(performance_df)
+
+    if preview:
+        for model in models:
+            avg_performance_per_market = calculate_avg_performance_per_market(performance_df, model, confidence_interval=True)
+            print(f"\nAverage Performance per Market for {model}:")
+            print(avg_performance_per_market.to_string(index=False))
+        print("\nPreview run, results are not published")
+    else:
+        publish_results(RESULTS_DIR, RESULTS_DATASET, results)
 
     node_complications_df, unique_nodes_with_complications, total_complications = analyze_node_complications(data, node_job_counts)
 
@@ -278,9 +331,12 @@ def main():
         max_performance_per_market = calculate_max_performance_per_market(performance_df, 'llama3')
         print("\nHighest Performance per Market for llama3:")
         print(max_performance_per_market.to_string(index=False))
+        if preview:
+            # The sample is a subset of the jobs, the full run can only find a higher max
+            print("(Preview: the sampled max is a lower bound of the max over all jobs)")
 
          # New addition: Average performance per market for llama3
-        avg_performance_per_market = calculate_avg_performance_per_market(performance_df, 'llama3')
+        avg_performance_per_market = calculate_avg_performance_per_market(performance_df, 'llama3', confidence_interval=preview)
         print("\nAverage Performance per Market for llama3:")
         print(avg_performance_per_market.to_string(index=False))
 
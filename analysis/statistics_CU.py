@@ -1,8 +1,13 @@
-import json
 import pandas as pd
-import os
 import argparse
 
+from records import GpuInfo, load_jobs, report_decode_errors
+from results_store import publish_results
+from sampling import add_sample_arguments, mean_confidence_interval, resolve_sample_fraction, sample_jobs
+
+RESULTS_DIR = 'results'
+RESULTS_DATASET = 'cu_benchmark'
+
 # Market ID to market name mapping
 MARKET_MAP = {
     "Crop49jpc7prcgAcS82WbWyGHwbN5GgDym3uFbxxCTZg": "H100",
@@ -26,19 +31,20 @@ MARKET_MAP = {
 
 # Load JSON data from file
 def load_data(file_path):
-    with open(file_path, 'r') as f:
-        return json.load(f)
+    data, errors = load_jobs(file_path)
+    report_decode_errors(errors)
+    return data
 
 # Check if the job contains all necessary information
 def has_valid_performance_data(job):
     required_fields = ["totalDuration", "totalTokensProduced", "totalInputTokens", "averageTokensPerSecond", "NosanaPrice"]
-    if not job.get("node") or not job.get("market") or not job.get("price") or not job.get("duration"):
+    if not job.node or not job.market or not job.price or not job.duration:
         return False
-    performance = job.get("data", {}).get("performance", {})
+    performance = job.data.performance
     if not performance:
         return False
     for metrics in performance.values():
-        if not all(field in metrics and metrics[field] is not None for field in required_fields):
+        if not all(getattr(metrics, field) is not None for field in required_fields):
             return False
     return True
 
@@ -67,19 +73,19 @@ def extract_performance_data(data):
         if not has_valid_performance_data(job):
             continue
 
-        node_id = job.get("node")
-        market_name = MARKET_MAP.get(job.get("market"), "Unknown")
-        specs = job.get("data", {}).get("specs", {})
-        performance = job.get("data", {}).get("performance", {})
-        price = float(job.get("price", 0))
-        duration = float(job.get("duration", 0))
-
-        nosana_price = next(iter(performance.values()), {}).get("NosanaPrice", None)
-        cpu = specs.get("cpu")
-        gpu_info = specs.get("gpu_info", {}).get("1", {})
-        gpu_name = gpu_info.get("name", "Unknown GPU")
+        node_id = job.node
+        market_name = MARKET_MAP.get(job.market, "Unknown")
+        specs = job.data.specs
+        performance = job.data.performance
+        price = float(job.price)
+        duration = float(job.duration)
+
+        nosana_price = next(iter(performance.values())).NosanaPrice
+        cpu = specs.cpu
+        gpu_info = specs.gpu_info.get("1")
+        gpu_name = gpu_info.name if isinstance(gpu_info, GpuInfo) else "Unknown GPU"
         
-        total_cu_duration = sum(metrics.get("totalDuration", 0) for metrics in performance.values())
+        total_cu_duration = sum(metrics.totalDuration for metrics in performance.values())
 
         # Initialize a dictionary to store CU-specific metrics
         cu_metrics = {
@@ -98,12 +104,12 @@ def extract_performance_data(data):
 
         # Iterate over each CU configuration
         for cu_key, metrics in performance.items():
-            cu_count = metrics.get("concurrentUsers", 0)
-            tokens_per_second = metrics.get("averageTokensPerSecond", 0)
-            total_tokens_produced = metrics.get("totalTokensProduced", 0)
-            total_duration = metrics.get("totalDuration", 0)
-            average_latency = metrics.get("averageLatency", 0)
-            total_input_tokens = metrics.get("totalInputTokens", 0)
+            cu_count = metrics.concurrentUsers
+            tokens_per_second = metrics.averageTokensPerSecond
+            total_tokens_produced = metrics.totalTokensProduced
+            total_duration = metrics.totalDuration
+            average_latency = metrics.averageLatency
+            total_input_tokens = metrics.totalInputTokens
 
 
             if total_input_tokens > total_tokens_produced*2:
@@ -116,10 +122,10 @@ def extract_performance_data(data):
                 node_output_tokens_map[node_id].append(total_tokens_produced)
                 continue 
 
-            avg_clock_speed = metrics.get("AvgClockSpeed", 0)
-            avg_power_usage = metrics.get("AvgPowerUsage", 0)
-            avg_utilization = metrics.get("AvgUtilization", 0)
-            model_name = metrics.get("modelName", "Unknown Model")
+            avg_clock_speed = metrics.AvgClockSpeed
+            avg_power_usage = metrics.AvgPowerUsage
+            avg_utilization = metrics.AvgUtilization
+            model_name = metrics.modelName
 
             cu_metrics["ModelName"] = model_name
 
@@ -156,24 +162,55 @@ def extract_performance_data(data):
         #print(f"Node: {node}, Total Output Tokens: {output_tokens_list}")
     return pd.DataFrame(performance_data)
 
-# Main function to process data and save to CSV
+# Mean output tokens per second per model, CU level and market or GPU, with 95% confidence intervals
+def calculate_cu_performance(performance_df, by):
+    speed_columns = [col for col in performance_df.columns if col.startswith('CU') and col.endswith('_MeanTokensPerSecond')]
+    speeds = performance_df.melt(
+        id_vars=['ModelName', by], value_vars=speed_columns, var_name='CU', value_name='MeanTokensPerSecond'
+    ).dropna(subset=['MeanTokensPerSecond'])
+    speeds['CU'] = speeds['CU'].str.split('_').str[0].str[2:].astype(int)
+
+    cu_performance = speeds.groupby(['ModelName', 'CU', by])['MeanTokensPerSecond'].mean().round(2).reset_index()
+    cu_performance = pd.merge(cu_performance, mean_confidence_interval(speeds, ['ModelName', 'CU', by], 'MeanTokensPerSecond'), on=['ModelName', 'CU', by])
+    return cu_performance.sort_values(['ModelName', 'CU', 'MeanTokensPerSecond'], ascending=[True, True, False])
+
+# Main function to process data and publish the results
 def main():
     parser = argparse.ArgumentParser(description='Analyze benchmark data.')
     parser.add_argument('--file_path', default='data/benchmark_data.json', help='Path to the benchmark data JSON file')
+    add_sample_arguments(parser)
     args = parser.parse_args()
 
     data = load_data(args.file_path)
+
+    # Preview runs work on a sample, print confidence intervals and don't publish results
+    sample_fraction = resolve_sample_fraction(args, len(data))
+    if sample_fraction is not None:
+        total_jobs_available = len(data)
+        data = dict(sample_jobs(data.items(), sample_fraction, args.seed))
+        print(f"\nPreview on a sample of {len(data)} of {total_jobs_available} jobs (seed {args.seed})")
+
     performance_df = extract_performance_data(data)
 
     print(f"\nTotal number of jobs analyzed: {len(performance_df)}")
 
-    # Save the final DataFrame to CSV
-    results_dir = 'results'
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
-
-    performance_summary_file = os.path.join(results_dir, 'CU_benchmark_results_Nosana.csv')
-    performance_df.to_csv(performance_summary_file, index=False)
+    if performance_df.empty:
+        if sample_fraction is not None:
+            print("\nNo jobs with valid CU benchmark results in the sample, try a larger --sample or --sample-jobs")
+        else:
+            print("\nNo jobs with valid CU benchmark results, nothing to publish")
+        return
+
+    if sample_fraction is not None:
+        print("\nMean Output Tokens per Second per Market:")
+        print(calculate_cu_performance(performance_df, 'Market').to_string(index=False))
+        print("\nMean Output Tokens per Second per GPU:")
+        print(calculate_cu_performance(performance_df, 'GPU').to_string(index=False))
+        print("\nPreview run, results are not published")
+        return
+
+    # Publish the final DataFrame as a new results generation
+    publish_results(RESULTS_DIR, RESULTS_DATASET, {'CU_benchmark_results_Nosana': performance_df})
 
     #print("\nCompressed Performance Summary:")
     #print(performance_df.to_string(index=False))
@@ -0,0 +1,119 @@
+import random
+
+import pandas as pd
+
+from records import Job, JobData, Metrics
+from regressions import (
+    EVENT_COLUMNS, active_regressions, detect_regressions, load_previous_run, pending_jobs,
+    progress_from_df, progress_to_df, state_from_df, state_to_df, RESULTS_DATASET
+)
+from results_store import publish_results
+
+# Jobs of one node with normal noise of a coefficient of variation around the given levels
+# Jobs of one node with normal noise of a coefficient of variation around the
+# given levels, a minute apart when a start time is given
+def make_jobs(levels, node='node0', seed=1, cv=0.1, start_time=None):
+    rng = random.Random(seed)
+    return {
+        f'{node}-job{i}': Job(
+            node=node,
+            time_end=None if start_time is None else start_time + i * 60,
+            data=JobData(performance={'llama3': Metrics(tokensPerSecond=rng.gauss(level, cv * level))})
+        )
+        for i, level in enumerate(levels)
+    }
+
+def test_no_change_points():
+    detectors = {}
+    events = detect_regressions(make_jobs([60] * 300).items(), detectors)
+    assert events.empty
+    active = active_regressions(events, detectors)
+    assert active.empty
+    assert list(active.columns) == [col for col in EVENT_COLUMNS if col != 'Direction']
+
+def test_no_false_alarms_on_realistic_noise():
+    rng = random.Random(2)
+    for cv in (0.08, 0.12):
+        data = {}
+        for node in range(100):
+            data.update(make_jobs([rng.uniform(20, 120)] * 500, node=f'node{node}', seed=node, cv=cv))
+        detectors = {}
+        assert detect_regressions(data.items(), detectors).empty
+        assert not any(detector.regressed for detector in detectors.values())
+
+def test_single_outliers_are_no_regression():
+    data = make_jobs([60] * 300)
+    for i in range(40, 300, 25):
+        data[f'node0-job{i}'].data.performance['llama3'].tokensPerSecond = 20.0
+    assert detect_regressions(data.items(), {}).empty
+
+def test_regression_and_recovery():
+    detectors = {}
+    events = detect_regressions(make_jobs([60] * 80 + [36] * 80 + [60] * 80).items(), detectors)
+    assert list(events['Direction']) == ['Regression', 'Recovery']
+    assert active_regressions(events, detectors).empty
+
+def test_partial_rise_is_no_recovery():
+    detectors = {}
+    # Dropped 40%, then rose 15% above the new level but still far below the old one
+    events = detect_regressions(make_jobs([60] * 80 + [36] * 80 + [41.4] * 80).items(), detectors)
+    assert list(events['Direction']) == ['Regression']
+    active = active_regressions(events, detectors)
+    assert list(active['Node']) == ['node0']
+
+def test_jobs_are_fed_in_time_order():
+    data = make_jobs([60] * 80 + [36] * 80 + [60] * 80, start_time=1_700_000_000)
+    expected = detect_regressions(data.items(), {})
+    # Newest first, like the collector stores them
+    newest_first = dict(reversed(list(data.items())))
+    jobs, _, _ = pending_jobs(newest_first)
+    events = detect_regressions(jobs, {})
+    assert list(events['Direction']) == ['Regression', 'Recovery']
+    assert events['DetectedJob'].tolist() == expected['DetectedJob'].tolist()
+
+def test_jobs_ending_before_the_last_processed_job_are_skipped():
+    data = make_jobs([60] * 20, start_time=1_700_000_000)
+    items = list(data.items())
+    _, progress, _ = pending_jobs(dict(items[:5] + items[10:15]))
+    jobs, progress, skipped = pending_jobs(data, progress)
+    assert skipped == 5
+    assert [job_id for job_id, _ in jobs] == [job_id for job_id, _ in items[15:]]
+    assert progress == (0, None, 15, data['node0-job19'].time_end)
+
+def publish_run(results_dir, jobs, detectors, progress):
+    events = detect_regressions(jobs, detectors)
+    publish_results(results_dir, RESULTS_DATASET, {
+        'node_regressions': events,
+        'active_regressions': active_regressions(events, detectors),
+        'detector_state': state_to_df(detectors),
+        'progress': progress_to_df(progress),
+    })
+
+def resume(results_dir, data):
+    previous = load_previous_run(results_dir)
+    pending = pending_jobs(data, progress_from_df(previous['progress']))
+    if pending is None:
+        return None
+    jobs, _, skipped = pending
+    assert skipped == 0
+    new_events = detect_regressions(jobs, state_from_df(previous['detector_state']))
+    return list(previous['node_regressions']['DetectedJob']) + list(new_events['DetectedJob'])
+
+def test_resume_matches_full_run(tmp_path):
+    for start_time in (None, 1_700_000_000):
+        data = make_jobs([60] * 80 + [36] * 80 + [60] * 80, start_time=start_time)
+        full_events = detect_regressions(pending_jobs(data)[0], {})
+        assert list(full_events['Direction']) == ['Regression', 'Recovery']
+
+        # The first run saw the oldest 120 jobs, timed ones can be in any order
+        first_run = list(data.items())[:120]
+        if start_time is not None:
+            first_run.reverse()
+        jobs, progress, _ = pending_jobs(dict(first_run))
+        publish_run(str(tmp_path), jobs, {}, progress)
+        assert resume(str(tmp_path), data) == full_events['DetectedJob'].tolist()
+
+def test_resume_restarts_when_data_changed(tmp_path):
+    data = make_jobs([60] * 20)
+    publish_run(str(tmp_path), [], {}, (10, 'other', 0, None))
+    assert resume(str(tmp_path), data) is None
@@ -0,0 +1,59 @@
+import os
+import time
+
+import pandas as pd
+
+import results_store
+from results_store import (
+    GENERATIONS_DIR, KEEP_GENERATIONS, POINTER_FILE, STALE_STAGING_SECONDS,
+    load_results, publish_results
+)
+
+def live_generation(results_dir, dataset):
+    with open(os.path.join(results_dir, dataset, POINTER_FILE)) as f:
+        return f.read().strip()
+
+def test_publish_swaps_pointer(tmp_path):
+    results_dir = str(tmp_path)
+    first = publish_results(results_dir, 'dataset', {'table': pd.DataFrame({'Value': [1, 2]})})
+    assert live_generation(results_dir, 'dataset') == os.path.basename(first)
+    second = publish_results(results_dir, 'dataset', {'table': pd.DataFrame({'Value': [3]})})
+    assert live_generation(results_dir, 'dataset') == os.path.basename(second)
+    assert load_results(results_dir, 'dataset')['table']['Value'].tolist() == [3]
+
+def test_publishes_in_a_row_get_ordered_names(tmp_path):
+    results_dir = str(tmp_path)
+    paths = [
+        publish_results(results_dir, 'dataset', {'table': pd.DataFrame({'Value': [i]})}, keep=10)
+        for i in range(5)
+    ]
+    names = [os.path.basename(path) for path in paths]
+    assert len(set(names)) == 5
+    assert sorted(names, key=results_store._generation_timestamp) == names
+    assert load_results(results_dir, 'dataset')['table']['Value'].tolist() == [4]
+
+def test_prune_keeps_newest_generations(tmp_path):
+    results_dir = str(tmp_path)
+    paths = [
+        publish_results(results_dir, 'dataset', {'table': pd.DataFrame({'Value': [i]})})
+        for i in range(KEEP_GENERATIONS + 3)
+    ]
+    generations_dir = os.path.join(results_dir, 'dataset', GENERATIONS_DIR)
+    kept = sorted(os.listdir(generations_dir))
+    assert kept == sorted(os.path.basename(path) for path in paths[-KEEP_GENERATIONS:])
+
+def test_prune_only_removes_stale_staging(tmp_path):
+    results_dir = str(tmp_path)
+    generations_dir = os.path.join(results_dir, 'dataset', GENERATIONS_DIR)
+    os.makedirs(generations_dir)
+    # Staging directory of a run that is still writing, and one of a run killed long ago
+    in_progress = os.path.join(generations_dir, '20000101T000000.000000000-1-0.tmp')
+    killed = os.path.join(generations_dir, '20000101T000000.000000000-2-0.tmp')
+    os.makedirs(in_progress)
+    os.makedirs(killed)
+    stale = time.time() - STALE_STAGING_SECONDS - 60
+    os.utime(killed, (stale, stale))
+
+    publish_results(results_dir, 'dataset', {'table': pd.DataFrame({'Value': [1]})})
+    assert os.path.isdir(in_progress)
+    assert not os.path.exists(killed)
@@ -0,0 +1,67 @@
+import json
+import math
+import os
+import subprocess
+import sys
+from collections import Counter
+
+import pandas as pd
+
+from records import Job
+from sampling import Z_95, mean_confidence_interval, sample_jobs
+
+ANALYSIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def make_jobs(jobs_per_node):
+    return [
+        (f'{node}-job{i}', Job(node=node))
+        for node, count in jobs_per_node.items()
+        for i in range(count)
+    ]
+
+def test_sample_is_deterministic():
+    jobs = make_jobs({'node0': 500, 'node1': 300})
+    first = [job_id for job_id, _ in sample_jobs(jobs, 0.1, seed=1)]
+    assert first == [job_id for job_id, _ in sample_jobs(jobs, 0.1, seed=1)]
+    assert first != [job_id for job_id, _ in sample_jobs(jobs, 0.1, seed=2)]
+
+def test_sample_is_stratified_per_node():
+    jobs_per_node = {'node0': 1000, 'node1': 95, 'node2': 3, 'node3': 1}
+    jobs = make_jobs(jobs_per_node)
+    sample = list(sample_jobs(jobs, 0.1))
+    counts = Counter(job.node for _, job in sample)
+    assert counts == {node: math.ceil(0.1 * count) for node, count in jobs_per_node.items()}
+    # Original order is kept
+    order = {job_id: index for index, (job_id, _) in enumerate(jobs)}
+    assert sorted(sample, key=lambda item: order[item[0]]) == sample
+
+def test_full_sample_keeps_every_job():
+    jobs = make_jobs({'node0': 10, 'node1': 5})
+    assert list(sample_jobs(jobs, 1.0)) == jobs
+
+def test_mean_confidence_interval():
+    df = pd.DataFrame({'Market': ['a'] * 4 + ['b'] * 2, 'Value': [1.0, 2.0, 3.0, 4.0, 10.0, 12.0]})
+    intervals = mean_confidence_interval(df, 'Market', 'Value').set_index('Market')
+    margin = Z_95 * df[df['Market'] == 'a']['Value'].std() / 2
+    assert intervals.loc['a', 'CI95Low'] == round(2.5 - margin, 2)
+    assert intervals.loc['a', 'CI95High'] == round(2.5 + margin, 2)
+    assert intervals.loc['b', 'Samples'] == 2
+
+def run_preview(tmp_path, script, *args):
+    # Jobs without any benchmark results, so the sample has no performance data
+    file_path = tmp_path / 'benchmark_data.json'
+    file_path.write_text(json.dumps({f'job{i}': {'node': f'node{i % 2}', 'data': {'performance': {}}} for i in range(4)}))
+    return subprocess.run(
+        [sys.executable, os.path.join(ANALYSIS_DIR, script), *args, str(file_path), '--sample-jobs', '1'],
+        capture_output=True, text=True, cwd=tmp_path
+    )
+
+def test_statistics_preview_without_performance_data(tmp_path):
+    result = run_preview(tmp_path, 'statistics.py')
+    assert result.returncode == 0, result.stderr
+    assert 'No jobs with performance data in the sample' in result.stdout
+
+def test_cu_preview_without_performance_data(tmp_path):
+    result = run_preview(tmp_path, 'statistics_CU.py', '--file_path')
+    assert result.returncode == 0, result.stderr
+    assert 'No jobs with valid CU benchmark results in the sample' in result.stdout
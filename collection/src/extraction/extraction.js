@@ -10,6 +10,8 @@ export async function extraction(id, job, nosana) {
     market: job.market.toString(), 
     price: job.price.toString(), 
     duration: (job.timeEnd - job.timeStart).toString(), 
+    time_start: job.timeStart,
+    time_end: job.timeEnd,
     data: {
       specs: {},
       performance: {},
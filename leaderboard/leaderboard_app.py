@@ -1,27 +1,72 @@
 import streamlit as st
 import pandas as pd
-import os
 
-# Load the CSV files
-results_dir = '../results'
-overall_file = 'small_model_node_performance_summary.csv'
-overall_data = pd.read_csv(os.path.join(results_dir, overall_file))
+from results_reader import current_generation, map_generation
 
-# Get list of model-specific CSV files
-model_files = [f for f in os.listdir(results_dir) if f.startswith('model_') and f.endswith('_performance_summary.csv')]
-models = ['Overall'] + [f.split('_')[1] for f in model_files]
+results_dir = '../results'
+results_dataset = 'node_performance'
+
+# Map the live results generation. The generation is resolved once per rerun, so
+# every table shown in a rerun comes from the same analysis run, and a newly
+# published generation is only picked up by the next rerun.
+@st.cache_resource(max_entries=2)
+def load_generation(generation_dir):
+    return map_generation(generation_dir)
+
+generation_dir = current_generation(results_dir, results_dataset)
+tables = load_generation(generation_dir)
+overall_data = tables['small_model_node_performance_summary']
+
+# Get list of model-specific tables
+model_tables = [name for name in tables if name.startswith('model_') and name.endswith('_performance_summary')]
+models = ['Overall'] + [name.split('_')[1] for name in model_tables]
+
+# Regressions the nodes haven't recovered from yet, published by analysis/regressions.py
+try:
+    active_regressions = load_generation(current_generation(results_dir, 'regressions'))['active_regressions']
+except FileNotFoundError:
+    active_regressions = pd.DataFrame(columns=['Node', 'Model', 'CU', 'ChangePercent'])
+
+# Map each regressed node to a flag with its largest drop for the selected model
+def load_regression_flags(model):
+    # These models only have single request benchmarks (CU level 0 in the regressions report)
+    regressions = active_regressions[active_regressions['CU'] == 0]
+    if model == 'Overall':
+        regressions = regressions[regressions['Model'] != 'llama3_70b']
+    else:
+        regressions = regressions[regressions['Model'] == model.replace('-', '_')]
+    worst_drop = regressions.groupby('Node')['ChangePercent'].min()
+    return '⚠️ ' + worst_drop.round(1).astype(str) + '%'
 
 # Function to load data based on selected model
 def load_data(model):
     if model == 'Overall':
         return overall_data
     else:
-        file_name = f'model_{model}_performance_summary.csv'
-        return pd.read_csv(os.path.join(results_dir, file_name))
+        return tables[f'model_{model}_performance_summary']
 
 # Select the required columns
 columns_to_select = ['Node', 'GPU', 'CPU', 'MeanTokensPerSecond', 'TotalProducedTokens', 'Jobs', 'Market']
 
+# Select, rename and round the leaderboard columns of a model once per results
+# generation. The generation directory is part of the cache key, so a new
+# generation is prepared again.
+@st.cache_data(max_entries=32)
+def load_leaderboard_data(generation_dir, model):
+    model_data = load_data(model)[columns_to_select].rename(columns={
+        'MeanTokensPerSecond': 'Tokens per Second',
+        'TotalProducedTokens': 'Total Tokens',
+    })
+    model_data['Tokens per Second'] = model_data['Tokens per Second'].round(2)
+    return model_data
+
+# Numbers are sent to the browser as typed columns and formatted there
+column_config = {
+    'Tokens per Second': st.column_config.NumberColumn(format='%.2f'),
+    'Total Tokens': st.column_config.NumberColumn(format='%d'),
+    'Jobs': st.column_config.NumberColumn(format='%d'),
+}
+
 # Streamlit app
 st.set_page_config(page_title="Nosana Node Leaderboard", page_icon=":trophy:", layout="wide")
 
@@ -39,21 +84,12 @@ st.markdown(
 st.markdown("<h1 style='text-align: center;'>🏆 Nosana Node Leaderboard 🏆</h1>", unsafe_allow_html=True)
 
 # Load initial data
-leaderboard_data = overall_data[columns_to_select]
-
-# Rename the columns
-leaderboard_data.rename(columns={
-    'MeanTokensPerSecond': 'Tokens per Second',
-    'TotalProducedTokens': 'Total Tokens',
-}, inplace=True)
+leaderboard_data = load_leaderboard_data(generation_dir, 'Overall')
 
 # Calculate the total amount of jobs and total amount of nodes
 total_jobs = leaderboard_data['Jobs'].sum()
 total_nodes = leaderboard_data['Node'].nunique()
 
-# Round Tokens per Second column to 2 decimal places and convert to string for formatting
-leaderboard_data['Tokens per Second'] = leaderboard_data['Tokens per Second'].map('{:.2f}'.format)
-
 # Get unique markets
 markets = ['All'] + sorted(leaderboard_data['Market'].unique().tolist())
 
@@ -81,6 +117,9 @@ st.markdown(
         <p>
             <i>*Lamma3-70B is excluded from the overall performance because there are no benchmark results for all markets</i>
         </p>
+        <p>
+            <i>*⚠️ marks nodes whose tokens per second recently dropped and haven't recovered, with the size of the drop</i>
+        </p>
     </div>
     """,
     unsafe_allow_html=True
@@ -95,13 +134,7 @@ def display_leaderboard(market):
         search_value = st.text_input('Enter search value:', key=f"{market}_search_value")
 
     # Load data for the selected model
-    model_data = load_data(selected_model)
-    model_data = model_data[columns_to_select]
-    model_data.rename(columns={
-        'MeanTokensPerSecond': 'Tokens per Second',
-        'TotalProducedTokens': 'Total Tokens',
-    }, inplace=True)
-    model_data['Tokens per Second'] = model_data['Tokens per Second'].map('{:.2f}'.format)
+    model_data = load_leaderboard_data(generation_dir, selected_model)
 
     if market == 'All':
         filtered_data = model_data
@@ -110,12 +143,13 @@ def display_leaderboard(market):
     
     # Remove the 'Market' column from the displayed data
     display_data = filtered_data.drop(columns=['Market'])
+    display_data.insert(1, 'Regression', display_data['Node'].map(load_regression_flags(selected_model)).fillna(''))
     
     if search_value:
         display_data = display_data[display_data[search_column].astype(str).str.contains(search_value, case=False, na=False)]
     
-    # Display the styled leaderboard
-    st.table(display_data)
+    # Display the leaderboard
+    st.dataframe(display_data, column_config=column_config)
 
 # Create tabs for market selection
 tabs = st.tabs(markets)
@@ -1,11 +1,27 @@
 import streamlit as st
 import pandas as pd
-import os
 
-# Load the CSV file
+from results_reader import current_generation, map_generation
+
 results_dir = 'results'
-benchmark_file = 'CU_benchmark_results_Nosana.csv'
-benchmark_data = pd.read_csv(os.path.join(results_dir, benchmark_file), dtype={'Market': str})
+results_dataset = 'cu_benchmark'
+
+# Map the live results generation. It is resolved once per rerun, so a newly
+# published generation is only picked up by the next rerun.
+@st.cache_resource(max_entries=2)
+def load_generation(generation_dir):
+    return map_generation(generation_dir)
+
+generation_dir = current_generation(results_dir, results_dataset)
+benchmark_data = load_generation(generation_dir)['CU_benchmark_results_Nosana']
+
+# Regressions the nodes haven't recovered from yet, published by analysis/regressions.py
+try:
+    regressions_generation_dir = current_generation(results_dir, 'regressions')
+    active_regressions = load_generation(regressions_generation_dir)['active_regressions']
+except FileNotFoundError:
+    regressions_generation_dir = None
+    active_regressions = pd.DataFrame(columns=['Node', 'Model', 'CU', 'ChangePercent'])
 
 def get_cu_columns():
     cu_columns = [col for col in benchmark_data.columns if 'MeanTokensPerSecond' in col]
@@ -22,7 +38,10 @@ def get_markets():
     markets.insert(0, 'All markets combined')
     return markets
 
-def load_cu_data(cu, model, market):
+# Prepared once per selection and results generation. The generation directories
+# are part of the cache key, so a new generation is prepared again.
+@st.cache_data(max_entries=64)
+def load_cu_data(generation_dirs, cu, model, market):
     cu_number = cu.split()[-1]  # Extract the CU number (e.g., '1', '5', '100')
     cu_columns = [col for col in benchmark_data.columns if col.startswith(f'CU{cu_number}_')]
     common_columns = ['Node', 'Market', 'StartupTime', 'ModelName', 'NosanaPrice', 'GPU-Price-Per-Hour']
@@ -59,21 +78,20 @@ def load_cu_data(cu, model, market):
     cu_data.columns = [col.replace(f'CU{cu_number}_', '').replace('_', ' ') for col in cu_data.columns]
     cu_data.rename(columns=column_mapping, inplace=True)
 
-    # Format the data for display
-    formatter = {}
-    for col in cu_data.columns:
-        if col == 'Market':  # Skip formatting for the 'Market' column
-            continue
-        elif cu_data[col].dtype == 'float64':
-            formatter[col] = lambda x: f"{x:.2f}" if pd.notna(x) else ""
-        elif cu_data[col].dtype == 'int64':
-            formatter[col] = lambda x: f"{x:.0f}" if pd.notna(x) else ""
+    # Round the decimal columns once, the browser formats the typed columns for display
+    float_columns = [col for col in cu_data.columns if pd.api.types.is_float_dtype(cu_data[col])]
+    cu_data[float_columns] = cu_data[float_columns].round(2)
+
+    # Flag nodes with an active regression for this model and CU level
+    regressions = active_regressions[(active_regressions['Model'] == model) & (active_regressions['CU'] == int(cu_number))]
+    regression_flags = '⚠️ ' + regressions.groupby('Node')['ChangePercent'].min().round(1).astype(str) + '%'
+    cu_data['Regression'] = cu_data['Node'].map(regression_flags).fillna('')
 
     if 'Output Speed (Output Tokens/s)' in cu_data.columns:
         cu_data = cu_data.sort_values(by='Output Speed (Output Tokens/s)', ascending=False)
 
     column_order = [
-        'Node', 'Market', 'Model Name', 'GPU Price ($/h)', 'NOS ($)',
+        'Node', 'Regression', 'Market', 'Model Name', 'GPU Price ($/h)', 'NOS ($)',
         'Output Speed (Output Tokens/s)', 'End User Speed (Output Tokens/s)', 'Total Speed (Output+Input Tokens/s)', 'Latency (s)',
         'Price ($ per 1M Tokens)', 'Clock Speed (GHz)', 'Power Usage (W)'
     ]
@@ -127,17 +145,17 @@ selected_model = st.selectbox('Select Model', models, index=models.index('llama3
 selected_market = st.selectbox('Select Market', markets, index=0)
 
 
-cu_data = load_cu_data(selected_cu, selected_model, selected_market)
-
+cu_data = load_cu_data((generation_dir, regressions_generation_dir), selected_cu, selected_model, selected_market)
 
-formatter = {}
+# Format numbers per column in the browser instead of per cell in Python
+column_config = {}
 for col in cu_data.columns:
-    if cu_data[col].dtype == 'float64':  # Assuming your decimal columns are float type
-        formatter[col] = lambda x: f"{x:.2f}" if pd.notna(x) else ""  # Retain two decimal places
-    elif cu_data[col].dtype == 'int64':
-        formatter[col] = lambda x: f"{x:.0f}" if pd.notna(x) else ""  # No commas for integers
+    if pd.api.types.is_float_dtype(cu_data[col]):  # Assuming your decimal columns are float type
+        column_config[col] = st.column_config.NumberColumn(format='%.2f')  # Retain two decimal places
+    elif pd.api.types.is_integer_dtype(cu_data[col]):
+        column_config[col] = st.column_config.NumberColumn(format='%d')  # No commas for integers
 
-st.dataframe(cu_data.style.format(formatter), width=1800)
+st.dataframe(cu_data, column_config=column_config, width=1800)
 
 total_jobs = cu_data.shape[0]
 total_nodes = cu_data['Node'].nunique()
@@ -154,6 +172,9 @@ st.markdown("""
         <p>
             Use the dropdown menus above to view results for different concurrent user configurations, models, and markets.
         </p>
+        <p>
+            <i>*⚠️ marks nodes whose tokens per second recently dropped and haven't recovered, with the size of the drop</i>
+        </p>
     </div>
     """, unsafe_allow_html=True)
 
@@ -0,0 +1,33 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+
+# Layout written by analysis/results_store.py
+GENERATIONS_DIR = 'generations'
+POINTER_FILE = 'CURRENT'
+TABLE_SUFFIX = '.arrow'
+
+
+# Resolve the directory of the live generation of a dataset
+def current_generation(results_dir, dataset):
+    with open(os.path.join(results_dir, dataset, POINTER_FILE), 'r') as f:
+        generation = f.read().strip()
+    return os.path.join(results_dir, dataset, GENERATIONS_DIR, generation)
+
+
+# Memory map a single table read-only. The Arrow buffers point straight into the
+# page cache and the pandas columns wrap them without copying.
+def map_table(path):
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+# Map every table of a generation, keyed by table name
+def map_generation(generation_dir):
+    return {
+        name[:-len(TABLE_SUFFIX)]: map_table(os.path.join(generation_dir, name))
+        for name in sorted(os.listdir(generation_dir))
+        if name.endswith(TABLE_SUFFIX)
+    }